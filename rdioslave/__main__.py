@@ -4,6 +4,7 @@ import argparse
 import getpass
 import six
 
+from .control import start_control_server
 from .player import Player
 from .rdio_web import RdioWebClient
 
@@ -22,10 +23,19 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('-c', '--config', default="rdio_session.json")
     parser.add_argument('--stream-player', default="external", choices=["external", "mock"])
+    parser.add_argument('--overlap', type=float, default=0,
+                        help="start each track this many seconds before the previous one ends")
+    parser.add_argument('--control-port', type=int, default=None,
+                        help="serve the local control API on this localhost port")
+    parser.add_argument('--control-socket', default=None,
+                        help="serve the local control API on this Unix socket")
     args = parser.parse_args()
 
     api_client = get_client_session(args.config)
-    player = Player(api_client, use_stream_player=args.stream_player)
+    player = Player(api_client, use_stream_player=args.stream_player,
+                    overlap=args.overlap)
+    start_control_server(player, port=args.control_port,
+                         unix_socket=args.control_socket)
     player.run()
 
 if __name__ == "__main__":
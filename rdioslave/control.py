@@ -0,0 +1,157 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import json
+import six
+
+from tornado import gen, httpserver, ioloop, netutil, web
+
+from .util import TaskSupervisor
+
+
+POST_COMMANDS = frozenset((
+    "play", "pause", "togglePause", "next", "previous",
+    "queue", "unqueue", "move", "status",
+))
+
+# Only accept requests addressed to, and made from pages on, this machine, so
+# that web pages open in a local browser can't control the player (by CSRF
+# or DNS rebinding).
+LOCAL_HOSTS = frozenset(("localhost", "127.0.0.1", "::1"))
+
+
+class ControlHandler(web.RequestHandler):
+    """Local control endpoint; calls Player coroutines directly instead of
+    routing commands through Rdio's pubsub server."""
+
+    def initialize(self, player):
+        self.player = player
+
+    def prepare(self):
+        host = six.moves.urllib.parse.urlsplit("//" + self.request.host).hostname
+        if host not in LOCAL_HOSTS:
+            raise web.HTTPError(403, "non-local Host: %s", self.request.host)
+        origin = self.request.headers.get("Origin")
+        if (origin is not None and
+                six.moves.urllib.parse.urlsplit(origin).hostname not in LOCAL_HOSTS):
+            raise web.HTTPError(403, "non-local Origin: %s", origin)
+
+    def get(self, command):
+        if command == "status":
+            self.write_status()
+        elif command in POST_COMMANDS:
+            raise web.HTTPError(405)
+        else:
+            raise web.HTTPError(404)
+
+    @gen.coroutine
+    def post(self, command):
+        player = self.player
+        spawn, replace = player.tasks.spawn, player.tasks.replace
+        if player.player_state is None:
+            # Still launching; we haven't fetched the state from Rdio yet.
+            raise web.HTTPError(503)
+
+        if command == "play":
+            key = self.get_argument("key", None)
+            if key is not None:
+                play_command = {"key": key}
+                index = self.get_int_argument("index", None)
+                if index is not None:
+                    play_command["index"] = index
+                yield self.run_task(replace, "command", player.play_source, play_command)
+            elif not player.is_active:
+                yield self.run_task(spawn, "command", player.toggle_pause)
+        elif command == "pause":
+            player.pause()
+        elif command == "togglePause":
+            if player.is_active:
+                player.pause()
+            else:
+                yield self.run_task(spawn, "command", player.toggle_pause)
+        elif command == "next":
+            yield self.run_task(spawn, "command", player.next_track)
+        elif command == "previous":
+            yield self.run_task(spawn, "command", player.previous_track)
+        elif command == "queue":
+            yield self.run_task(
+                    spawn, "local", player.queue_sources, self.get_keys(), True)
+        elif command == "unqueue":
+            yield self.run_task(spawn, "local", player.unqueue_sources, self.get_keys())
+        elif command == "move":
+            key = self.get_argument("key")
+            position = self.get_int_argument("position")
+            if not 0 <= position < len(player.queue):
+                raise web.HTTPError(400, "position %d is out of range", position)
+            moved = yield self.run_task(
+                    spawn, "local", player.move_queued_source, key, position)
+            if not moved:
+                raise web.HTTPError(400, "%s is not queued", key)
+        elif command == "status":
+            pass
+        else:
+            raise web.HTTPError(404)
+
+        if player.is_master:
+            player.publish_master_state()
+        self.write_status()
+
+    @gen.coroutine
+    def run_task(self, start, category, func, *args):
+        """Run a Player coroutine through its task supervisor and wait for it.
+
+        start is the supervisor's spawn or replace method.
+        """
+        try:
+            future = start(category, func, *args)
+        except TaskSupervisor.Full:
+            raise web.HTTPError(503, "too many pending %s tasks", category)
+        try:
+            result = yield future
+        except Exception:
+            # The supervisor has already printed the traceback.
+            raise web.HTTPError(500, "%s failed", func.__name__)
+        raise gen.Return(result)
+
+    def get_int_argument(self, name, *default):
+        value = self.get_argument(name, *default)
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise web.HTTPError(400, "%s must be an integer", name)
+
+    def get_keys(self):
+        # Accept both repeated key=... arguments and comma-separated lists.
+        keys = [key for arg in self.get_arguments("key")
+                for key in arg.split(",") if key]
+        if not keys:
+            raise web.HTTPError(400, "missing key")
+        return keys
+
+    def write_status(self):
+        self.set_header("Content-Type", "application/json")
+        self.write(json.dumps(self.player.status()))
+
+
+def make_app(player):
+    return web.Application([
+        (r"/(\w+)", ControlHandler, dict(player=player)),
+    ])
+
+
+def start_control_server(player, port=None, unix_socket=None,
+                         address="127.0.0.1"):
+    """Serve the control API on the IOLoop that the player runs on.
+
+    Listens on a TCP port (bound to localhost by default), a Unix socket,
+    or both. Returns the HTTPServer, or None if neither was given.
+    """
+    if port is None and unix_socket is None:
+        return None
+    server = httpserver.HTTPServer(make_app(player), io_loop=ioloop.IOLoop.instance())
+    if port is not None:
+        server.listen(port, address=address)
+    if unix_socket is not None:
+        server.add_socket(netutil.bind_unix_socket(unix_socket))
+    return server
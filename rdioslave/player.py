@@ -6,17 +6,37 @@ import sys
 
 from tornado import gen, ioloop, process
 
+from .source_queue import SourceQueue
 from .stream_player import MockStreamPlayer, StreamPlayer
-from .util import add_future, d
+from .util import TaskSupervisor, d
 
 
 ALBUMISH_TYPES = frozenset(("a", "al", "p"))
 STATION_TYPES = frozenset(("lr", "rr", "h", "e", "tr", "c", "tp"))
 
+# Commands that change what's playing run one at a time, and only a few may
+# wait their turn. Commands that don't need the network (pausing, editing the
+# queue) skip that line entirely. Only the latest state save matters, and the
+# other API writes (start events) needn't pile up.
+TASK_LIMITS = {
+    "command": 1,
+    "save_state": 1,
+    "api_write": 2,
+}
+TASK_MAX_PENDING = {
+    "command": 4,
+    "api_write": 16,
+}
+
 
 class Player(object):
-    def __init__(self, api_client, use_stream_player="external"):
+    def __init__(self, api_client, use_stream_player="external", overlap=0):
         self.client = api_client
+        # Seconds before the end of a track to start the next one.
+        self.overlap = overlap
+        self.transition_timeout = None
+        # The next_track started by on_transition_due, until it's done.
+        self.early_transition = None
 
         if use_stream_player == "external":
             self.stream_player = StreamPlayer(self.on_stream_ended)
@@ -25,18 +45,20 @@ class Player(object):
         else:
             assert False
 
+        self.tasks = TaskSupervisor(TASK_LIMITS, TASK_MAX_PENDING)
+
         self.queue = None
         self.player_state = None
         self.is_master = False
         self.is_active = False
 
     def run(self):
-        add_future(self.launch())
+        self.tasks.spawn("launch", self.launch)
         ioloop.IOLoop.instance().start()
 
     @gen.coroutine
     def launch(self):
-        yield self.client.setup_pubsub(self.pubsub_message_handler)
+        yield self.client.setup_pubsub(self.pubsub_message_handler, self.tasks)
         yield self.get_state()
         yield self.play_current_track()
 
@@ -58,26 +80,28 @@ class Player(object):
                 command = message["command"]
                 print(("got remote command: %s" % command["type"]))
                 if command["type"] == "togglePause":
-                    add_future(self.toggle_pause())
+                    if self.is_active:
+                        self.pause()
+                    else:
+                        self.spawn_command(self.toggle_pause)
                 elif command["type"] == "next":
-                    add_future(self.next_track())
+                    self.spawn_command(self.next_track)
                 elif command["type"] == "previous":
-                    add_future(self.previous_track())
+                    self.spawn_command(self.previous_track)
                 elif command["type"] == "playSource":
-                    add_future(self.play_source(command))
+                    self.tasks.replace("command", self.play_source, command)
                 elif command["type"] == "playQueuedSource":
-                    add_future(self.play_queued_source(command))
+                    self.tasks.replace("command", self.play_queued_source, command)
                 elif command["type"] == "queueSource":
-                    add_future(self.queue_source(command))
+                    self.tasks.spawn("local", self.queue_source, command)
                 elif command["type"] == "set":
                     key = command["key"]
                     value = command["value"]
                     if key == "sourcePosition":
-                        self.player_state['currentSource']['currentPosition'] = value
-                        add_future(self.play_current_track())
+                        self.tasks.replace("command", self.play_position, value)
                     elif key == "station":
                         sys.stdout.flush()
-                        add_future(self.set_station(value))
+                        self.tasks.replace("command", self.set_station, value)
                 else:
                     assert False, "unrecognized remote command: %s" % json.dumps(command, indent=4)
             elif (user_channel, event) == ("player", "masterQuery"):
@@ -101,14 +125,61 @@ class Player(object):
             if not self.is_master:
                 self.publish_master_state() # claim control of the world
                 self.is_master = True
-                add_future(self.play_current_track())
+                self.tasks.replace("command", self.play_current_track)
 
         else:
             raise AssertionError("unexpected op %s" % op)
 
     def on_stream_ended(self):
         print("STREAM ENDED")
-        add_future(self.next_track())
+        self.cancel_transition()
+        if self.early_transition is not None and not self.early_transition.done():
+            # The next track is already on its way.
+            return
+        self.spawn_command(self.next_track)
+
+    def spawn_command(self, func, *args, **kwargs):
+        try:
+            return self.tasks.spawn("command", func, *args, **kwargs)
+        except TaskSupervisor.Full:
+            print("too many pending commands; dropping %s" % func.__name__)
+
+    def current_track(self):
+        source = self.player_state and self.player_state['currentSource']
+        if source is None:
+            return None
+        if source['type'] in (ALBUMISH_TYPES | STATION_TYPES):
+            return source['tracks']['items'][source['currentPosition']]
+        elif source['type'] == "t":
+            return source
+        else:
+            assert False, "not implemented!"
+
+    def has_next_track(self):
+        source = self.player_state['currentSource']
+        if source is None:
+            return False
+        if source['type'] in ALBUMISH_TYPES:
+            if source['currentPosition'] + 1 < len(source['tracks']['items']):
+                return True
+        elif source['type'] in STATION_TYPES:
+            return True
+        return bool(self.queue) or bool(self.player_state['station'])
+
+    def status(self):
+        source = self.player_state and self.player_state['currentSource']
+        status = {
+            "isMaster": self.is_master,
+            "isActive": self.is_active,
+            "currentSource": None,
+            "track": None,
+            "queue": self.queue.keys() if self.queue is not None else [],
+            "tasks": self.tasks.counts(),
+        }
+        if source is not None:
+            status["currentSource"] = source['key']
+            status["track"] = self.current_track()['key']
+        return status
 
     def publish_master_state(self):
         self.client.pub("player",
@@ -119,7 +190,10 @@ class Player(object):
                         })
 
     @gen.coroutine
-    def play_current_track(self):
+    def play_current_track(self, overlap=False, resume=True):
+        """Play the current track. Unless resume is set, only do so if we're
+        already playing, so that track changes don't undo a pause."""
+        self.cancel_transition()
         if not all((self.player_state, self.is_master)):
             return
 
@@ -131,26 +205,58 @@ class Player(object):
         source = self.player_state['currentSource']
         if source is None:
             return
-        if source['type'] in (ALBUMISH_TYPES | STATION_TYPES):
-            track_key = source['tracks']['items'][source['currentPosition']]['key']
-        elif source['type'] == "t":
-            track_key = source['key']
-        else:
-            assert False, "not implemented!"
+        track = self.current_track()
+        track_key = track['key']
 
+        self.tasks.replace("save_state", self.save_state)
+        if not (self.is_active or resume):
+            return
         self.is_active = True
-        add_future(self.save_state())
-        add_future(self.client.add_start_event(source['key'], track_key))
+        try:
+            self.tasks.spawn("api_write", self.client.add_start_event, source['key'], track_key)
+        except TaskSupervisor.Full:
+            # Start events are only bookkeeping; don't let them stop playback.
+            print("too many pending start events; dropping %s" % track_key)
         playback_info = yield self.client.get_playback_info(track_key)
         d(playback_info)
-        self.stream_player.play_stream(playback_info)
+        if not self.is_active:
+            # We were paused while waiting for the playback info.
+            return
+        self.stream_player.play_stream(playback_info, overlap=overlap)
+        self.schedule_transition(track.get('duration'))
+
+    def schedule_transition(self, duration):
+        """Start the next track self.overlap seconds before this one ends.
+
+        The duration is counted from now, so this is only approximate. Short
+        tracks aren't overlapped, so that a run of them isn't skipped through.
+        """
+        if not self.overlap or not duration or duration <= 2 * self.overlap:
+            return
+        io_loop = ioloop.IOLoop.instance()
+        self.transition_timeout = io_loop.add_timeout(
+                io_loop.time() + duration - self.overlap, self.on_transition_due)
+
+    def cancel_transition(self):
+        if self.transition_timeout is not None:
+            ioloop.IOLoop.instance().remove_timeout(self.transition_timeout)
+            self.transition_timeout = None
+
+    def on_transition_due(self):
+        self.transition_timeout = None
+        if not self.has_next_track():
+            # Let the last track play out; on_stream_ended will stop us.
+            return
+        print("STARTING NEXT TRACK EARLY")
+        # play_stream lets the current stream finish once the next is ready.
+        self.early_transition = self.spawn_command(self.next_track, overlap=True)
 
     @gen.coroutine
     def get_state(self):
         result = yield self.client.get_player_state()
         print('RESULT QUEUE:')
         d(result['queue'])
-        self.queue = result['queue']['data']
+        self.queue = SourceQueue(result['queue']['data'])
         self.player_state = result['playerState']
         d(self.player_state)
 
@@ -179,9 +285,9 @@ class Player(object):
         }
         print("saving:")
         d(state_to_save)
-        queue_to_save = self.queue
+        queue_to_save = self.queue.to_list()
         d(queue_to_save)
-        ret = yield self.client.save_player_state(player_state=state_to_save, queue=self.queue)
+        ret = yield self.client.save_player_state(player_state=state_to_save, queue=queue_to_save)
 
     @gen.coroutine
     def toggle_pause(self):
@@ -193,11 +299,23 @@ class Player(object):
             self.publish_master_state()
             yield self.play_current_track()
 
+    def pause(self):
+        """Stop playing, and drop any track changes still waiting to run."""
+        self.tasks.clear("command")
+        if self.is_active:
+            self.stop_player()
+
     def stop_player(self):
+        self.cancel_transition()
         self.is_active = False
         self.publish_master_state()
         self.stream_player.kill_stream()
 
+    @gen.coroutine
+    def play_position(self, position):
+        self.player_state['currentSource']['currentPosition'] = position
+        yield self.play_current_track()
+
     @gen.coroutine
     def set_station(self, station_key):
         if self.is_active:
@@ -253,15 +371,33 @@ class Player(object):
 
     @gen.coroutine
     def queue_source(self, command):
-        key = command["key"]
-        self.queue.append({"key": key})
-        yield self.save_state()
+        yield self.queue_sources([command["key"]])
+
+    @gen.coroutine
+    def queue_sources(self, keys, dedup=False):
+        # Don't wait for the save, so that a burst of queued sources only
+        # saves the queue once it has caught up.
+        if self.queue.extend(({"key": key} for key in keys), dedup):
+            self.tasks.replace("save_state", self.save_state)
+
+    @gen.coroutine
+    def unqueue_sources(self, keys):
+        if self.queue.remove(keys):
+            self.tasks.replace("save_state", self.save_state)
+
+    @gen.coroutine
+    def move_queued_source(self, key, position):
+        if key not in self.queue:
+            raise gen.Return(False)
+        self.queue.move(key, position)
+        self.tasks.replace("save_state", self.save_state)
+        raise gen.Return(True)
 
     @gen.coroutine
     def next_source(self):
         if self.queue:
             # TODO: eliminate this latency by preloading sources in queue
-            key = self.queue.pop(0)["key"]
+            key = self.queue.pop()["key"]
             result = yield self.client.get([key], ["tracks"])
             source = result[key]
             self.player_state['currentSource'] = source
@@ -276,11 +412,11 @@ class Player(object):
             # Out of things to play. Stop.
             self.stop_player()
             self.player_state['currentSource'] = None
-            yield self.save_state()
+            yield self.tasks.replace("save_state", self.save_state)
             return
 
     @gen.coroutine
-    def next_track(self):
+    def next_track(self, overlap=False):
         print()
         print("CHANGING TRACKS: NEXT")
         print()
@@ -311,7 +447,7 @@ class Player(object):
             d(source)
             assert False, "unhandled object type %s (above)" % source['type']
 
-        yield self.play_current_track()
+        yield self.play_current_track(overlap=overlap, resume=False)
 
     @gen.coroutine
     def previous_track(self):
@@ -328,4 +464,4 @@ class Player(object):
             d(source)
             assert False, "unhandled object type %s (above)" % source['type']
 
-        yield self.play_current_track()
+        yield self.play_current_track(resume=False)
@@ -8,8 +8,6 @@ import six
 
 from tornado import gen, httpclient, ioloop, websocket
 
-from .util import add_future
-
 class RdioWebClient(object):
     SERVER = "www.rdio.com"
     API_VERSION = "1"
@@ -30,6 +28,7 @@ class RdioWebClient(object):
         # client state
         self.ws = None
         self.pubsub_data = None
+        self.tasks = None
 
     ####################
     # Session
@@ -93,12 +92,14 @@ class RdioWebClient(object):
     ####################
 
     @gen.coroutine
-    def setup_pubsub(self, on_message):
+    def setup_pubsub(self, on_message, tasks=None):
+        if tasks is not None:
+            self.tasks = tasks
         self.pubsub_data = yield self.pubsub_info()
         host = self.pubsub_data['servers'][0]
         self.ws = yield websocket.websocket_connect("ws://%s" % host)
 
-        add_future(self.pubsub_read(on_message))
+        self.tasks.spawn("pubsub", self.pubsub_read, on_message)
 
         self.connect()
 
@@ -0,0 +1,101 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import collections
+
+
+class SourceQueue(object):
+    """The play queue: an ordered list of sources, each a dict with a 'key'.
+
+    Duplicate keys are allowed, as in the queue Rdio shows (whose positions
+    ours must match), but append() and extend() can skip sources that are
+    already queued. Popping the head and looking up a key's position are
+    O(1); other removals and reordering are O(n).
+    """
+
+    def __init__(self, items=()):
+        self._rebuild(items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __bool__(self):
+        return bool(self._items)
+    __nonzero__ = __bool__
+
+    def keys(self):
+        return [item['key'] for item in self._items]
+
+    def to_list(self):
+        return list(self._items)
+
+    def position(self, key):
+        """The current position of (the first occurrence of) key, or None."""
+        if key not in self._index:
+            return None
+        return self._index[key][0] - self._head
+
+    def append(self, item, dedup=False):
+        """Add a source to the end of the queue. With dedup, don't if it's
+        already queued.
+
+        Returns whether it was added.
+        """
+        if dedup and item['key'] in self._index:
+            return False
+        self._push(item)
+        return True
+
+    def extend(self, items, dedup=False):
+        """Append several sources; returns the number actually added."""
+        return sum(1 for item in items if self.append(item, dedup))
+
+    def pop(self, position=0):
+        if position == 0:
+            item = self._items.popleft()
+            self._head += 1
+            positions = self._index[item['key']]
+            positions.popleft()
+            if not positions:
+                del self._index[item['key']]
+            return item
+        items = list(self._items)
+        item = items.pop(position)
+        self._rebuild(items)
+        return item
+
+    def remove(self, keys):
+        """Remove every occurrence of the given keys; returns the number of
+        sources removed."""
+        keys = set(keys)
+        items = [item for item in self._items if item['key'] not in keys]
+        removed = len(self._items) - len(items)
+        if removed:
+            self._rebuild(items)
+        return removed
+
+    def move(self, key, position):
+        """Move a queued key to a new position, clamped to the queue's bounds."""
+        if key not in self._index:
+            raise KeyError(key)
+        items = list(self._items)
+        item = items.pop(self.position(key))
+        items.insert(min(max(position, 0), len(items)), item)
+        self._rebuild(items)
+
+    def _push(self, item):
+        self._index[item['key']].append(self._head + len(self._items))
+        self._items.append(item)
+
+    def _rebuild(self, items):
+        self._items = collections.deque()
+        # key -> absolute positions, i.e. self._head + positions in self._items
+        self._index = collections.defaultdict(collections.deque)
+        self._head = 0
+        for item in items:
+            self._push(item)
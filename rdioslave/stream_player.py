@@ -6,21 +6,19 @@ import sys
 from tornado import ioloop, process
 
 class MockStreamPlayer(object):
-    def play_stream(self, surl):
-        print("--- WOULD PLAY STREAM ---")
+    def play_stream(self, surl, overlap=False):
+        print("--- WOULD PLAY STREAM%s ---" % (" (OVERLAPPED)" if overlap else ""))
         print("--- %s ---" % surl)
+    def let_finish(self):
+        print("--- WOULD LET STREAM FINISH ---")
     def kill_stream(self):
         print("--- WOULD KILL STREAM ---")
         pass
 
-class StreamPlayer(object):
-    def __init__(self, on_stream_ended):
-        self.download_p = None
-        self.play_p = None
-        self.on_stream_ended = on_stream_ended
+class StreamPipeline(object):
+    """An rtmpdump process piped into an mplayer process."""
 
-    def play_stream(self, info):
-        self.kill_stream()
+    def __init__(self, info, exit_callback):
         download_cmd = ["rtmpdump",
                         "-r", "rtmpe://%s%s" % (info['streamHost'], info['streamApp']),
                         "-a", info['streamApp'][1:],
@@ -32,30 +30,58 @@ class StreamPlayer(object):
                 download_cmd, stdout=subprocess.PIPE, io_loop=ioloop.IOLoop.instance())
         self.play_p = process.Subprocess(
                 play_cmd, stdin=self.download_p.stdout, io_loop=ioloop.IOLoop.instance())
-        self.play_p.set_exit_callback(self.stream_ended_cb(self.play_p))
+        self.play_p.set_exit_callback(lambda ret: exit_callback(self))
 
-    def kill_stream(self):
-        if self.play_p:
-            play_p = self.play_p
-            self.play_p = None
+    def terminate(self):
+        for p in (self.play_p, self.download_p):
             try:
-                play_p.proc.terminate()
-            except OSError:
-                pass
-        if self.download_p:
-            download_p = self.download_p
-            self.download_p = None
-            try:
-                download_p.proc.terminate()
+                p.proc.terminate()
             except OSError:
                 pass
 
-    def stream_ended_cb(self, cb_play_p):
-        def callback(ret):
-            if self.play_p != cb_play_p:
-                # we killed the stream... don't call the callback
-                return
-            else:
-                self.kill_stream()
-                self.on_stream_ended()
-        return callback
+class StreamPlayer(object):
+    """Plays one stream at a time, except that a stream which is finishing
+    (see let_finish) can keep playing while the next one starts."""
+
+    def __init__(self, on_stream_ended):
+        self.pipeline = None
+        self.finishing_pipeline = None
+        self.on_stream_ended = on_stream_ended
+
+    def play_stream(self, info, overlap=False):
+        """Start playing a stream. With overlap, let the current stream
+        finish rather than cutting it off."""
+        if overlap:
+            self.let_finish()
+        else:
+            self.kill_stream()
+        self.pipeline = StreamPipeline(info, self.pipeline_exited)
+
+    def let_finish(self):
+        """Let the current stream play to its end alongside the next one.
+
+        on_stream_ended won't be called for it.
+        """
+        if self.pipeline is None:
+            return
+        self.kill_pipeline('finishing_pipeline')
+        self.finishing_pipeline = self.pipeline
+        self.pipeline = None
+
+    def kill_stream(self):
+        self.kill_pipeline('pipeline')
+        self.kill_pipeline('finishing_pipeline')
+
+    def kill_pipeline(self, attr):
+        pipeline = getattr(self, attr)
+        if pipeline:
+            setattr(self, attr, None)
+            pipeline.terminate()
+
+    def pipeline_exited(self, pipeline):
+        if pipeline is self.finishing_pipeline:
+            self.kill_pipeline('finishing_pipeline')
+        elif pipeline is self.pipeline:
+            self.kill_pipeline('pipeline')
+            self.on_stream_ended()
+        # else we killed the stream... don't call the callback
@@ -1,15 +1,125 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import collections
+import functools
 import json
+import sys
+import traceback
 
-from tornado import ioloop
+from tornado import concurrent, gen, ioloop
 
 def d(x):
     print(json.dumps(x, indent=4))
 
-def add_future(future):
-    ioloop.IOLoop.instance().add_future(future, check_future)
 
-def check_future(future):
-    # If there was an exception, this will reraise it
-    future.result()
+class TaskSupervisor(object):
+    """Runs fire-and-forget coroutines, grouped into named categories.
+
+    Each category may have a concurrency limit; tasks beyond the limit wait
+    their turn, and a category may also cap how many tasks can be waiting.
+    Tasks that have already started can't be interrupted (tornado coroutines
+    have no cancellation), but replace() drops any still waiting. Failures
+    are printed along with the task that caused them instead of being raised
+    into the IOLoop.
+    """
+
+    class Full(Exception):
+        pass
+
+    class _Task(object):
+        def __init__(self, category, func, args, kwargs):
+            self.category = category
+            self.func = func
+            self.args = args
+            self.kwargs = kwargs
+            self.future = concurrent.Future()
+
+        def __repr__(self):
+            name = getattr(self.func, '__name__', repr(self.func))
+            args = [repr(a) for a in self.args]
+            args += ["%s=%r" % it for it in sorted(self.kwargs.items())]
+            return "%s:%s(%s)" % (self.category, name, ", ".join(args))
+
+    def __init__(self, limits=None, max_pending=None):
+        self.limits = dict(limits or {})
+        self.max_pending = dict(max_pending or {})
+        self.running = collections.defaultdict(set)
+        self.pending = collections.defaultdict(collections.deque)
+        self.completed = collections.defaultdict(int)
+        self.failed = collections.defaultdict(int)
+        self.superseded = collections.defaultdict(int)
+
+    def spawn(self, category, func, *args, **kwargs):
+        """Call func(*args, **kwargs) once category has a free slot.
+
+        Returns a future for the task's result, which callers may yield on
+        or ignore. Raises TaskSupervisor.Full if too many tasks are already
+        waiting in category.
+        """
+        pending = self.pending[category]
+        max_pending = self.max_pending.get(category)
+        if max_pending is not None and len(pending) >= max_pending:
+            raise self.Full("too many pending %s tasks" % category)
+        task = self._Task(category, func, args, kwargs)
+        pending.append(task)
+        self._start_pending(category)
+        return task.future
+
+    def replace(self, category, func, *args, **kwargs):
+        """Like spawn, but first drops the tasks still waiting in category."""
+        self.clear(category)
+        return self.spawn(category, func, *args, **kwargs)
+
+    def clear(self, category):
+        """Drop the tasks still waiting in category.
+
+        The futures of dropped tasks resolve to None.
+        """
+        pending = self.pending[category]
+        while pending:
+            task = pending.popleft()
+            self.superseded[category] += 1
+            task.future.set_result(None)
+
+    def counts(self):
+        categories = (set(self.running) | set(self.pending) |
+                      set(self.completed) | set(self.failed))
+        return dict((category, {
+            "running": len(self.running[category]),
+            "pending": len(self.pending[category]),
+            "completed": self.completed[category],
+            "failed": self.failed[category],
+            "superseded": self.superseded[category],
+        }) for category in categories)
+
+    def _start_pending(self, category):
+        limit = self.limits.get(category)
+        running = self.running[category]
+        pending = self.pending[category]
+        while pending and (limit is None or len(running) < limit):
+            task = pending.popleft()
+            running.add(task)
+            try:
+                future = gen.maybe_future(task.func(*task.args, **task.kwargs))
+            except Exception:
+                future = concurrent.Future()
+                future.set_exc_info(sys.exc_info())
+            ioloop.IOLoop.instance().add_future(
+                    future, functools.partial(self._task_done, task))
+
+    def _task_done(self, task, future):
+        self.running[task.category].discard(task)
+        try:
+            result = future.result()
+        except Exception:
+            self.failed[task.category] += 1
+            print("task failed: %r" % task)
+            traceback.print_exc()
+            task.future.set_exc_info(sys.exc_info())
+            # We've reported it; don't let tornado log it again if nobody
+            # is waiting on this task.
+            task.future.exception()
+        else:
+            self.completed[task.category] += 1
+            task.future.set_result(result)
+        self._start_pending(task.category)
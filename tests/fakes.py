@@ -0,0 +1,90 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from tornado import concurrent
+
+from rdioslave.player import Player
+from rdioslave.source_queue import SourceQueue
+
+
+def done_future(result=None):
+    future = concurrent.Future()
+    future.set_result(result)
+    return future
+
+
+class FakeClient(object):
+    """Stands in for RdioWebClient, answering API calls without a network."""
+
+    user_key = "s1"
+    player_id = "_rdioslave_test"
+
+    def __init__(self):
+        self.published = []
+        self.saved_queues = []
+        self.start_events = []
+        # Set to make API calls wait until their futures are resolved by hand.
+        self.stall_start_events = False
+        self.stall_playback_info = False
+        self.stalled = []
+
+    def _respond(self, stall, result):
+        if not stall:
+            return done_future(result)
+        future = concurrent.Future()
+        self.stalled.append((future, result))
+        return future
+
+    def resolve_stalled(self):
+        stalled, self.stalled = self.stalled, []
+        for future, result in stalled:
+            future.set_result(result)
+
+    def pub(self, channel, message):
+        self.published.append(message)
+
+    def save_player_state(self, player_state=None, queue=None):
+        self.saved_queues.append([item['key'] for item in queue])
+        return done_future()
+
+    def add_start_event(self, source, key):
+        self.start_events.append(key)
+        return self._respond(self.stall_start_events, None)
+
+    def get_playback_info(self, key):
+        return self._respond(self.stall_playback_info, {"surl": key})
+
+
+class FakeStreamPlayer(object):
+    def __init__(self):
+        self.playing = []
+        self.overlapped = []
+
+    def play_stream(self, info, overlap=False):
+        self.playing.append(info['surl'])
+        self.overlapped.append(overlap)
+
+    def kill_stream(self):
+        self.playing.append(None)
+        self.overlapped.append(False)
+
+    @property
+    def current(self):
+        return self.playing[-1] if self.playing else None
+
+
+def make_album(key, num_tracks, duration=None):
+    tracks = [{"key": "%s_t%d" % (key, i), "duration": duration}
+              for i in range(num_tracks)]
+    return {"key": key, "type": "a", "currentPosition": 0,
+            "tracks": {"items": tracks}}
+
+
+def make_player(source, queue=(), overlap=0):
+    client = FakeClient()
+    player = Player(client, use_stream_player="mock", overlap=overlap)
+    player.stream_player = FakeStreamPlayer()
+    player.queue = SourceQueue({"key": key} for key in queue)
+    player.player_state = {"currentSource": source, "station": None}
+    player.is_master = True
+    player.is_active = True
+    return player
@@ -0,0 +1,101 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import json
+
+from tornado import ioloop, testing
+
+from fakes import make_album, make_player
+from rdioslave.control import make_app
+
+
+class ControlTest(testing.AsyncHTTPTestCase):
+    def setUp(self):
+        # The player schedules everything on the global IOLoop.
+        ioloop.IOLoop().install()
+        self.player = make_player(make_album("a", 3), queue=["x", "y", "z"])
+        super(ControlTest, self).setUp()
+
+    def tearDown(self):
+        super(ControlTest, self).tearDown()
+        io_loop = ioloop.IOLoop.instance()
+        io_loop.clear_instance()
+        io_loop.close(all_fds=True)
+
+    def get_new_ioloop(self):
+        return ioloop.IOLoop.instance()
+
+    def get_app(self):
+        return make_app(self.player)
+
+    def post(self, path, body="", **kwargs):
+        return self.fetch(path, method="POST", body=body, **kwargs)
+
+    def test_status(self):
+        response = self.fetch("/status")
+        self.assertEqual(response.code, 200)
+        status = json.loads(response.body.decode("utf-8"))
+        self.assertEqual(status["track"], "a_t0")
+        self.assertEqual(status["queue"], ["x", "y", "z"])
+
+    def test_unknown_command(self):
+        self.assertEqual(self.fetch("/bogus").code, 404)
+        self.assertEqual(self.post("/bogus").code, 404)
+
+    def test_get_post_command(self):
+        self.assertEqual(self.fetch("/next").code, 405)
+
+    def test_non_local_host(self):
+        response = self.fetch("/status", headers={"Host": "evil.example.com"})
+        self.assertEqual(response.code, 403)
+        response = self.post("/next", headers={"Host": "evil.example.com:%d" % self.get_http_port()})
+        self.assertEqual(response.code, 403)
+        self.assertEqual(self.player.stream_player.playing, [])
+
+    def test_non_local_origin(self):
+        response = self.post("/next", headers={"Origin": "http://evil.example.com"})
+        self.assertEqual(response.code, 403)
+        self.assertEqual(self.player.stream_player.playing, [])
+
+    def test_local_origin(self):
+        response = self.post("/next", headers={"Origin": "http://localhost:8000"})
+        self.assertEqual(response.code, 200)
+        self.assertEqual(self.player.stream_player.current, "a_t1")
+
+    def test_queue_saves_once(self):
+        response = self.post("/queue", body="key=a,b&key=c&key=x")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(self.player.queue.keys(), ["x", "y", "z", "a", "b", "c"])
+        self.assertEqual(self.player.client.saved_queues,
+                         [["x", "y", "z", "a", "b", "c"]])
+
+    def test_queue_without_key(self):
+        self.assertEqual(self.post("/queue").code, 400)
+
+    def test_move(self):
+        response = self.post("/move", body="key=z&position=0")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(self.player.queue.keys(), ["z", "x", "y"])
+
+    def test_move_bad_position(self):
+        self.assertEqual(self.post("/move", body="key=z&position=first").code, 400)
+        self.assertEqual(self.post("/move", body="key=z&position=3").code, 400)
+        self.assertEqual(self.post("/move", body="key=z&position=-1").code, 400)
+        self.assertEqual(self.player.queue.keys(), ["x", "y", "z"])
+
+    def test_move_missing_key(self):
+        self.assertEqual(self.post("/move", body="key=q&position=0").code, 400)
+
+    def test_play_bad_index(self):
+        self.assertEqual(self.post("/play", body="key=a&index=x").code, 400)
+
+    def test_too_many_commands(self):
+        self.player.client.stall_playback_info = True
+        for i in range(5):
+            self.player.spawn_command(self.player.next_track)
+        self.assertEqual(self.post("/next").code, 503)
+
+    def test_pause(self):
+        response = self.post("/pause")
+        self.assertEqual(response.code, 200)
+        self.assertFalse(self.player.is_active)
+        self.assertFalse(json.loads(response.body.decode("utf-8"))["isActive"])
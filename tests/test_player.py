@@ -0,0 +1,139 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import unittest
+
+from tornado import concurrent, gen, ioloop
+
+from fakes import make_album, make_player
+
+
+class PlayerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+        # The player schedules everything on the global IOLoop.
+        self.io_loop.install()
+
+    def tearDown(self):
+        self.io_loop.clear_instance()
+        self.io_loop.close(all_fds=True)
+
+    def run_loop(self):
+        self.io_loop.run_sync(lambda: gen.moment)
+
+
+class PlayerTest(PlayerTestCase):
+    def test_next_track(self):
+        player = make_player(make_album("a", 3))
+        self.io_loop.run_sync(player.next_track)
+        self.assertEqual(player.stream_player.current, "a_t1")
+        self.assertEqual(player.client.start_events, ["a_t1"])
+        self.assertEqual(player.client.saved_queues, [[]])
+
+    def test_start_event_backlog_doesnt_stop_playback(self):
+        player = make_player(make_album("a", 30))
+        player.client.stall_start_events = True
+        for i in range(25):
+            self.io_loop.run_sync(player.next_track)
+        self.assertEqual(player.stream_player.current, "a_t25")
+        self.assertEqual(len(player.stream_player.playing), 25)
+        counts = player.tasks.counts()["api_write"]
+        self.assertEqual(counts["running"] + counts["pending"], 18)
+
+    def test_pause_isnt_undone_by_track_changes(self):
+        player = make_player(make_album("a", 5))
+        player.client.stall_playback_info = True
+        player.spawn_command(player.next_track)
+        player.spawn_command(player.next_track)
+        self.assertEqual(player.tasks.counts()["command"]["pending"], 1)
+
+        player.pause()
+        self.assertEqual(player.tasks.counts()["command"]["pending"], 0)
+        player.client.resolve_stalled()
+        self.run_loop()
+        self.assertFalse(player.is_active)
+        self.assertEqual(player.stream_player.playing, [None])
+
+    def test_remote_queue_source_keeps_duplicates(self):
+        player = make_player(make_album("a", 3), queue=["x"])
+        self.io_loop.run_sync(lambda: player.queue_source({"key": "x"}))
+        self.run_loop()
+        self.assertEqual(player.queue.keys(), ["x", "x"])
+        self.assertEqual(player.client.saved_queues, [["x", "x"]])
+
+    def test_next_track_while_paused(self):
+        player = make_player(make_album("a", 5))
+        player.is_active = False
+        self.io_loop.run_sync(player.next_track)
+        self.assertFalse(player.is_active)
+        self.assertEqual(player.stream_player.playing, [])
+        self.assertEqual(player.player_state["currentSource"]["currentPosition"], 1)
+        self.assertEqual(len(player.client.saved_queues), 1)
+
+
+class TransitionTest(PlayerTestCase):
+    def test_overlaps_next_track(self):
+        player = make_player(make_album("a", 3, duration=0.05), overlap=0.02)
+        self.io_loop.run_sync(player.play_current_track)
+        self.assertIsNotNone(player.transition_timeout)
+        self.io_loop.run_sync(lambda: gen.sleep(0.1))
+        self.assertEqual(player.stream_player.playing[:2], ["a_t0", "a_t1"])
+        self.assertEqual(player.stream_player.overlapped[:2], [False, True])
+
+    def test_short_tracks_arent_overlapped(self):
+        player = make_player(make_album("a", 3, duration=8), overlap=5)
+        self.io_loop.run_sync(player.play_current_track)
+        self.assertIsNone(player.transition_timeout)
+
+    def test_tracks_without_duration_arent_overlapped(self):
+        player = make_player(make_album("a", 3), overlap=5)
+        self.io_loop.run_sync(player.play_current_track)
+        self.assertIsNone(player.transition_timeout)
+
+    def test_last_track_isnt_overlapped(self):
+        player = make_player(make_album("a", 1, duration=60), overlap=5)
+        self.io_loop.run_sync(player.play_current_track)
+        self.assertFalse(player.has_next_track())
+        player.on_transition_due()
+        self.run_loop()
+        self.assertEqual(player.stream_player.playing, ["a_t0"])
+        self.assertIsNone(player.early_transition)
+
+    def test_last_album_track_with_queue_is_overlapped(self):
+        player = make_player(make_album("a", 1, duration=60), queue=["x"], overlap=5)
+        self.assertTrue(player.has_next_track())
+
+    def test_stream_ending_during_early_transition(self):
+        player = make_player(make_album("a", 3, duration=60), overlap=5)
+        self.io_loop.run_sync(player.play_current_track)
+        player.client.stall_playback_info = True
+        player.on_transition_due()
+        # The old stream ends before the next one is ready; don't skip ahead.
+        player.on_stream_ended()
+        self.assertEqual(player.tasks.counts()["command"]["pending"], 0)
+        player.client.resolve_stalled()
+        self.run_loop()
+        self.assertEqual(player.stream_player.playing, ["a_t0", "a_t1"])
+        self.assertEqual(player.stream_player.overlapped, [False, True])
+
+    def test_stream_ending_cancels_transition(self):
+        player = make_player(make_album("a", 3, duration=60), overlap=5)
+        self.io_loop.run_sync(player.play_current_track)
+        # Keep the next track from starting yet.
+        player.tasks.spawn("command", concurrent.Future)
+        player.on_stream_ended()
+        self.assertEqual(player.tasks.counts()["command"]["pending"], 1)
+        self.assertIsNone(player.transition_timeout)
+
+    def test_early_transition_dropped(self):
+        player = make_player(make_album("a", 10, duration=60), overlap=5)
+        self.io_loop.run_sync(player.play_current_track)
+        player.client.stall_playback_info = True
+        for i in range(5):
+            player.spawn_command(player.next_track)
+        player.on_transition_due()
+        self.assertIsNone(player.early_transition)
+        # The stream wasn't detached, so its end still moves us along.
+        player.tasks.clear("command")
+        player.on_stream_ended()
+        self.assertEqual(player.tasks.counts()["command"]["pending"], 1)
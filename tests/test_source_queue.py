@@ -0,0 +1,102 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import unittest
+
+from rdioslave.source_queue import SourceQueue
+
+
+def make_queue(keys):
+    return SourceQueue({"key": key} for key in keys)
+
+
+class SourceQueueTest(unittest.TestCase):
+    def assertPositions(self, queue):
+        # Every key's indexed position must match where it actually is.
+        keys = queue.keys()
+        for key in keys:
+            self.assertEqual(queue.position(key), keys.index(key))
+
+    def test_pop_head(self):
+        queue = make_queue("abcde")
+        self.assertEqual(queue.pop()["key"], "a")
+        self.assertEqual(queue.pop()["key"], "b")
+        self.assertEqual(queue.keys(), list("cde"))
+        self.assertEqual(queue.position("e"), 2)
+        self.assertIsNone(queue.position("a"))
+        self.assertNotIn("a", queue)
+        self.assertPositions(queue)
+
+    def test_pop_middle(self):
+        queue = make_queue("abcde")
+        queue.pop()
+        self.assertEqual(queue.pop(2)["key"], "d")
+        self.assertEqual(queue.keys(), list("bce"))
+        self.assertPositions(queue)
+
+    def test_pop_after_rebuild(self):
+        queue = make_queue("abcde")
+        queue.pop()
+        queue.remove(["c"])
+        queue.append({"key": "f"})
+        self.assertEqual(queue.pop()["key"], "b")
+        self.assertEqual(queue.keys(), list("def"))
+        self.assertPositions(queue)
+
+    def test_append(self):
+        queue = make_queue("ab")
+        self.assertTrue(queue.append({"key": "a"}))
+        self.assertEqual(queue.keys(), list("aba"))
+        self.assertEqual(queue.position("a"), 0)
+
+    def test_append_dedup(self):
+        queue = make_queue("ab")
+        self.assertFalse(queue.append({"key": "a"}, dedup=True))
+        self.assertEqual(queue.extend(({"key": key} for key in "bcc"), dedup=True), 1)
+        self.assertEqual(queue.keys(), list("abc"))
+        self.assertPositions(queue)
+
+    def test_loaded_duplicates_are_kept(self):
+        queue = make_queue("abac")
+        self.assertEqual(queue.keys(), list("abac"))
+        self.assertEqual(queue.position("a"), 0)
+        queue.pop()
+        self.assertEqual(queue.position("a"), 1)
+        queue.pop()
+        queue.pop()
+        self.assertNotIn("a", queue)
+        self.assertEqual(queue.keys(), ["c"])
+
+    def test_remove(self):
+        queue = make_queue("abacd")
+        self.assertEqual(queue.remove(["a", "d", "z"]), 3)
+        self.assertEqual(queue.keys(), list("bc"))
+        self.assertEqual(queue.remove(["z"]), 0)
+        self.assertPositions(queue)
+
+    def test_move(self):
+        queue = make_queue("abcd")
+        queue.pop()
+        queue.move("d", 0)
+        self.assertEqual(queue.keys(), list("dbc"))
+        queue.move("d", 2)
+        self.assertEqual(queue.keys(), list("bcd"))
+        self.assertPositions(queue)
+
+    def test_move_clamps(self):
+        queue = make_queue("abc")
+        queue.move("a", 10)
+        self.assertEqual(queue.keys(), list("bca"))
+        queue.move("c", -1)
+        self.assertEqual(queue.keys(), list("cba"))
+        self.assertPositions(queue)
+
+    def test_move_missing(self):
+        queue = make_queue("abc")
+        self.assertRaises(KeyError, queue.move, "z", 0)
+
+    def test_to_list_keeps_items(self):
+        items = [{"key": "a", "extra": 1}, {"key": "b"}]
+        queue = SourceQueue(items)
+        self.assertEqual(queue.to_list(), items)
+        self.assertTrue(queue)
+        self.assertFalse(SourceQueue())
@@ -0,0 +1,95 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import unittest
+
+from rdioslave import stream_player
+from rdioslave.stream_player import StreamPlayer
+
+
+class FakePipeline(object):
+    def __init__(self, info, exit_callback):
+        self.info = info
+        self.exit_callback = exit_callback
+        self.terminated = False
+
+    def terminate(self):
+        self.terminated = True
+
+    def exit(self):
+        self.exit_callback(self)
+
+
+class StreamPlayerTest(unittest.TestCase):
+    def setUp(self):
+        self.real_pipeline = stream_player.StreamPipeline
+        stream_player.StreamPipeline = FakePipeline
+        self.ended = 0
+        self.player = StreamPlayer(self.on_stream_ended)
+
+    def tearDown(self):
+        stream_player.StreamPipeline = self.real_pipeline
+
+    def on_stream_ended(self):
+        self.ended += 1
+
+    def test_current_stream_ends(self):
+        self.player.play_stream("a")
+        pipeline = self.player.pipeline
+        pipeline.exit()
+        self.assertEqual(self.ended, 1)
+        self.assertIsNone(self.player.pipeline)
+
+    def test_killed_stream_exits(self):
+        self.player.play_stream("a")
+        first = self.player.pipeline
+        self.player.play_stream("b")
+        self.assertTrue(first.terminated)
+        first.exit()
+        self.assertEqual(self.ended, 0)
+        self.assertEqual(self.player.pipeline.info, "b")
+
+    def test_overlap(self):
+        self.player.play_stream("a")
+        first = self.player.pipeline
+        self.player.play_stream("b", overlap=True)
+        second = self.player.pipeline
+        self.assertIs(self.player.finishing_pipeline, first)
+        self.assertFalse(first.terminated)
+
+        # The finishing stream ending doesn't count as the stream ending...
+        first.exit()
+        self.assertEqual(self.ended, 0)
+        self.assertIsNone(self.player.finishing_pipeline)
+        self.assertIs(self.player.pipeline, second)
+        # ...but the current one does.
+        second.exit()
+        self.assertEqual(self.ended, 1)
+
+    def test_overlap_replaces_finishing_stream(self):
+        self.player.play_stream("a")
+        first = self.player.pipeline
+        self.player.play_stream("b", overlap=True)
+        second = self.player.pipeline
+        self.player.play_stream("c", overlap=True)
+        self.assertTrue(first.terminated)
+        self.assertIs(self.player.finishing_pipeline, second)
+
+    def test_let_finish_then_overlap(self):
+        self.player.play_stream("a")
+        first = self.player.pipeline
+        self.player.let_finish()
+        self.assertIsNone(self.player.pipeline)
+        self.player.play_stream("b", overlap=True)
+        # The finishing stream wasn't replaced by the (empty) current one.
+        self.assertIs(self.player.finishing_pipeline, first)
+        self.assertFalse(first.terminated)
+
+    def test_kill_stream(self):
+        self.player.play_stream("a")
+        first = self.player.pipeline
+        self.player.play_stream("b", overlap=True)
+        second = self.player.pipeline
+        self.player.play_stream("c")
+        self.assertTrue(first.terminated)
+        self.assertTrue(second.terminated)
+        self.assertIsNone(self.player.finishing_pipeline)
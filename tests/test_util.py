@@ -0,0 +1,104 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import unittest
+
+from tornado import concurrent, gen, ioloop
+
+from rdioslave.util import TaskSupervisor
+
+
+class TaskSupervisorTest(unittest.TestCase):
+    def setUp(self):
+        self.io_loop = ioloop.IOLoop()
+        self.io_loop.make_current()
+        # TaskSupervisor schedules on the global IOLoop.
+        self.io_loop.install()
+        self.tasks = TaskSupervisor({"one": 1}, {"one": 2})
+        self.gates = []
+        self.started = []
+
+    def tearDown(self):
+        self.io_loop.clear_instance()
+        self.io_loop.close(all_fds=True)
+
+    def blocked(self, name):
+        # A coroutine that runs until its gate is opened.
+        gate = concurrent.Future()
+        self.gates.append(gate)
+        self.started.append(name)
+        return gate
+
+    def open_gates(self):
+        gates, self.gates = self.gates, []
+        for gate in gates:
+            gate.set_result(None)
+
+    def run_loop(self):
+        self.io_loop.run_sync(lambda: gen.moment)
+
+    def test_limit(self):
+        self.tasks.spawn("one", self.blocked, "a")
+        self.tasks.spawn("one", self.blocked, "b")
+        self.assertEqual(self.started, ["a"])
+        self.assertEqual(self.tasks.counts()["one"]["running"], 1)
+        self.assertEqual(self.tasks.counts()["one"]["pending"], 1)
+        self.open_gates()
+        self.run_loop()
+        self.assertEqual(self.started, ["a", "b"])
+        self.assertEqual(self.tasks.counts()["one"]["completed"], 1)
+
+    def test_max_pending(self):
+        self.tasks.spawn("one", self.blocked, "a")
+        self.tasks.spawn("one", self.blocked, "b")
+        self.tasks.spawn("one", self.blocked, "c")
+        self.assertRaises(TaskSupervisor.Full,
+                          self.tasks.spawn, "one", self.blocked, "d")
+        # Unlimited categories never fill up.
+        for i in range(10):
+            self.tasks.spawn("other", self.blocked, i)
+
+    def test_replace(self):
+        self.tasks.spawn("one", self.blocked, "a")
+        b = self.tasks.spawn("one", self.blocked, "b")
+        self.tasks.replace("one", self.blocked, "c")
+        self.assertTrue(b.done())
+        self.assertIsNone(b.result())
+        self.assertEqual(self.tasks.counts()["one"]["superseded"], 1)
+        self.open_gates()
+        self.run_loop()
+        self.assertEqual(self.started, ["a", "c"])
+
+    def test_clear(self):
+        self.tasks.spawn("one", self.blocked, "a")
+        b = self.tasks.spawn("one", self.blocked, "b")
+        self.tasks.clear("one")
+        self.assertIsNone(b.result())
+        self.open_gates()
+        self.run_loop()
+        self.assertEqual(self.started, ["a"])
+        self.assertEqual(self.tasks.counts()["one"]["running"], 0)
+
+    def test_failure(self):
+        @gen.coroutine
+        def fail():
+            raise ValueError("oops")
+        future = self.tasks.spawn("one", fail)
+        self.run_loop()
+        self.assertIsInstance(future.exception(), ValueError)
+        self.assertEqual(self.tasks.counts()["one"]["failed"], 1)
+
+    def test_synchronous_failure_releases_slot(self):
+        def fail():
+            raise ValueError("oops")
+        future = self.tasks.spawn("one", fail)
+        self.tasks.spawn("one", self.blocked, "a")
+        self.run_loop()
+        self.assertIsInstance(future.exception(), ValueError)
+        self.assertEqual(self.started, ["a"])
+        self.assertEqual(self.tasks.counts()["one"]["running"], 1)
+
+    def test_plain_return_value(self):
+        future = self.tasks.spawn("one", lambda: 42)
+        self.run_loop()
+        self.assertEqual(future.result(), 42)
+        self.assertEqual(self.tasks.counts()["one"]["running"], 0)